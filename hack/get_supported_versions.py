@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+
+# Copyright 2021 The Kubernetes Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Print the supported versions of kubernetes-csi repositories.
+
+Reads the published releases of one or more repositories and prints the
+minor versions that are still supported following the kubernetes-csi
+support policy: the latest minor version is always
+supported, an older minor version stays supported until one year after
+its first release or three months after its last patch release, whichever
+is later. With --doc the docker image published for each supported
+release is printed as well, ready to be pasted into the documentation.
+
+When GITHUB_TOKEN is set in the environment the GitHub REST API is used
+directly, which avoids spawning a gh process per request; without a
+token the data is read through the GitHub CLI as before.
+"""
+
+import argparse
+import concurrent.futures
+import datetime
+import functools
+import hashlib
+import http.client
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+
+# Compiled once at import time: both patterns run for every line of
+# `gh release list` output respectively every `gh release view` call.
+# The version pattern is only ever used with match(), which anchors it
+# at the start; the trailing guard stops the engine from exploring
+# partial digit matches on tags like v1.2.34-rc1.
+_VERSION_RE = re.compile(r"v(\d+)\.(\d+)\.(\d+)(?:$|[^\d])")
+_DOCKER_PULL_RE = re.compile(r"docker pull ([\./\-:\w\d]*)")
+
+# Release metadata of published versions is immutable, so the notes of a
+# tag are cached forever and only the release list expires.
+_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "csi-supported-versions")
+_RELEASE_LIST_TTL = 3600  # seconds
+
+# Calendar arithmetic on whole days is plenty for the support policy and
+# saves pulling in dateutil just for relativedelta.
+_ONE_YEAR = datetime.timedelta(days=365)
+_THREE_MONTHS = datetime.timedelta(days=90)
+
+_GITHUB_API_HOST = "api.github.com"
+
+_local = threading.local()
+
+
+def _github_token():
+    return os.environ.get("GITHUB_TOKEN")
+
+
+def _github_connection():
+    """Return this thread's keep-alive connection to the GitHub API.
+
+    Reusing the connection turns one TCP and TLS handshake per request
+    into one per run. HTTPSConnection is not thread safe, so each repo
+    worker thread keeps its own.
+    """
+    connection = getattr(_local, "connection", None)
+    if connection is None:
+        connection = http.client.HTTPSConnection(_GITHUB_API_HOST, timeout=30)
+        _local.connection = connection
+    return connection
+
+
+def _gh_api(path):
+    """Fetch path from the GitHub REST API, authenticated with GITHUB_TOKEN."""
+    headers = {
+        "Authorization": f"Bearer {_github_token()}",
+        "Accept": "application/vnd.github+json",
+        "User-Agent": "kubernetes-csi-supported-versions",
+    }
+    connection = _github_connection()
+    try:
+        connection.request("GET", path, headers=headers)
+        response = connection.getresponse()
+    except (http.client.HTTPException, OSError):
+        # The server may have closed the idle connection; retry once on
+        # a fresh one.
+        connection.close()
+        connection.request("GET", path, headers=headers)
+        response = connection.getresponse()
+    body = response.read()
+    # Anything but 200 (including the 301 a renamed repository answers
+    # with) would otherwise surface as a confusing parse error later.
+    if response.status != 200:
+        raise RuntimeError(f"GET {path} failed: {response.status} {response.reason}")
+    return json.loads(body)
+
+
+def _fetch_releases(repo):
+    """Return the release objects of repo from the REST API, newest first.
+
+    The JSON payload is cached on disk with the same TTL as the release
+    list, so both the version grouping and the docker image scan share
+    one paginated fetch per repository and hour.
+    """
+    cache = _cache_path(repo, "releases.json")
+    text = _cache_read(cache, max_age=_RELEASE_LIST_TTL)
+    if text is not None:
+        return json.loads(text)
+    releases = []
+    page = 1
+    while True:
+        batch = _gh_api(f"/repos/{repo}/releases?per_page=100&page={page}")
+        releases.extend(batch)
+        if len(batch) < 100:
+            break
+        page += 1
+    _cache_write(cache, json.dumps(releases))
+    return releases
+
+
+def _cache_path(*parts):
+    return os.path.join(_CACHE_DIR, hashlib.sha1("\n".join(parts).encode()).hexdigest() + ".txt")
+
+
+def _cache_read(path, max_age=None):
+    """Return the cached text, or None on a miss or an expired entry."""
+    try:
+        if max_age is not None and time.time() - os.path.getmtime(path) >= max_age:
+            return None
+        with open(path) as cached:
+            return cached.read()
+    except OSError:
+        return None
+
+
+def _cache_write(path, text):
+    os.makedirs(_CACHE_DIR, exist_ok=True)
+    with open(path, "w") as cached:
+        cached.write(text)
+
+
+@functools.lru_cache(maxsize=1)
+def check_gh_command():
+    """Return the absolute path of the GitHub CLI, aborting when missing.
+
+    The result is cached, and spawning gh through the absolute path
+    spares the OS a PATH walk on every invocation.
+    """
+    gh = shutil.which("gh")
+    if not gh:
+        print("Could not find the GitHub CLI (gh), please install it: https://cli.github.com/")
+        sys.exit(1)
+    return gh
+
+
+def duration_ago(dt, now=None):
+    """Return a human readable description of how long ago dt was.
+
+    Callers that format many timestamps pass the same precomputed now so
+    the clock is read once per run instead of once per call.
+    """
+    if now is None:
+        now = datetime.datetime.now()
+    days = (now - dt).days
+    if days >= 365:
+        years = days // 365
+        return f"{years} year{'s' if years > 1 else ''} ago"
+    if days >= 30:
+        months = days // 30
+        return f"{months} month{'s' if months > 1 else ''} ago"
+    if days >= 1:
+        return f"{days} day{'s' if days > 1 else ''} ago"
+    return "today"
+
+
+def parse_version(version):
+    """Split a vMAJOR.MINOR.PATCH tag into its numeric components."""
+    match = _VERSION_RE.match(version)
+    if match:
+        return tuple(int(part) for part in match.groups())
+    return None
+
+
+def get_versions_from_releases(repo):
+    """Group the published releases of repo by (major, minor) version."""
+    versions = defaultdict(list)
+    if _github_token():
+        for release in _fetch_releases(repo):
+            # Draft releases carry no publish timestamp.
+            if release["published_at"]:
+                _add_release(release["tag_name"], release["published_at"], versions)
+        return versions
+    # Fall back to the GitHub CLI when no token is available.
+    cache = _cache_path(repo, "releases")
+    cached = _cache_read(cache, max_age=_RELEASE_LIST_TTL)
+    if cached is not None:
+        for line in cached.splitlines():
+            _parse_release_line(line, versions)
+        return versions
+    # Stream the gh output so parsing overlaps with the network wait and
+    # the full release list is never buffered a second time.
+    with subprocess.Popen([check_gh_command(), "release", "-R", repo, "list"],
+                          stdout=subprocess.PIPE, text=True) as process:
+        lines = []
+        for line in process.stdout:
+            lines.append(line)
+            _parse_release_line(line, versions)
+    if process.returncode:
+        raise subprocess.CalledProcessError(process.returncode, process.args)
+    _cache_write(cache, "".join(lines))
+    return versions
+
+
+def _parse_release_line(line, versions):
+    """Add one line of `gh release list` output to the versions map."""
+    parts = line.rstrip("\n").split("\t")
+    if len(parts) >= 4:
+        _add_release(parts[0], parts[3], versions)
+
+
+def _add_release(tag, published, versions):
+    """Add one release tag with its publish timestamp to the versions map."""
+    parsed = parse_version(tag)
+    if not parsed:
+        return
+    major, minor, _ = parsed
+    # The timestamps are always of the fixed shape 2006-01-02T15:04:05Z,
+    # which fromisoformat parses an order of magnitude faster than the
+    # locale-aware strptime.
+    versions[(major, minor)].append(
+        (tag, datetime.datetime.fromisoformat(published.rstrip("Z"))))
+
+
+def end_of_life_grouped_versions(versions, now):
+    """Filter the grouped versions down to the supported ones.
+
+    The latest minor version is always supported. An older minor version
+    is supported until one year after its first release or three months
+    after its last patch release, whichever is later.
+    """
+    one_year_ago = now - _ONE_YEAR
+    three_months_ago = now - _THREE_MONTHS
+    supported = []
+
+    # Walk the minors newest first: the first one is always supported,
+    # and as soon as one falls outside both support windows every older
+    # minor does too, so the long tail of dead branches is never
+    # visited. Releases within a minor are already ordered newest first
+    # by the source.
+    for key in sorted(versions, reverse=True):
+        releases = versions[key]
+        if not supported:
+            supported.append(releases[0])
+            continue
+        last_release = releases[0]
+        first_release = releases[-1]
+        if first_release[1] > one_year_ago or last_release[1] > three_months_ago:
+            supported.append(last_release)
+        else:
+            break
+    return supported
+
+
+def get_release_docker_images(repo, versions):
+    """Return a map from release tag to the docker image in its notes.
+
+    Images of already seen tags come from the on-disk cache; only the
+    remaining tags are fetched and cached for the next run.
+    """
+    images = {}
+    missing = []
+    for version in versions:
+        cached = _cache_read(_cache_path(repo, version))
+        if cached is None:
+            missing.append(version)
+        else:
+            images[version] = cached or None
+    if missing:
+        if _github_token():
+            fetched = _extract_docker_images(_fetch_releases(repo), missing,
+                                             "tag_name", "body")
+        else:
+            fetched = _query_release_docker_images(repo, missing)
+        for version in missing:
+            images[version] = fetched.get(version)
+            _cache_write(_cache_path(repo, version), images[version] or "")
+    return images
+
+
+def _extract_docker_images(releases, versions, tag_key, body_key):
+    """Scan release notes for docker pull lines, keyed by release tag."""
+    wanted = set(versions)
+    images = {}
+    for release in releases:
+        if release[tag_key] in wanted:
+            match = _DOCKER_PULL_RE.search(release[body_key] or "")
+            images[release[tag_key]] = match.group(1) if match else None
+    return images
+
+
+def _query_release_docker_images(repo, versions):
+    """Fetch the docker images of versions with a single GraphQL query."""
+    owner, name = repo.split("/")
+    query = """query($owner: String!, $name: String!) {
+        repository(owner: $owner, name: $name) {
+            releases(first: 100) {
+                nodes { tagName description }
+            }
+        }
+    }"""
+    output = subprocess.check_output(
+        [check_gh_command(), "api", "graphql",
+         "-F", f"owner={owner}", "-F", f"name={name}", "-f", f"query={query}"],
+        text=True)
+    nodes = json.loads(output)["data"]["repository"]["releases"]["nodes"]
+    return _extract_docker_images(nodes, versions, "tagName", "description")
+
+
+def process_repo(repo, doc, now):
+    """Return the formatted supported-versions block for one repository."""
+    versions = get_versions_from_releases(repo)
+    supported_versions = end_of_life_grouped_versions(versions, now)
+    lines = [f"Supported versions of {repo}:", ""]
+    for version, published in supported_versions:
+        lines.append(f"{version} (released {duration_ago(published, now)})")
+    if doc:
+        lines.append("")
+        lines.append(f"Docker images of {repo}:")
+        lines.append("")
+        images = get_release_docker_images(
+            repo, [version for version, _ in supported_versions])
+        for version, _ in supported_versions:
+            lines.append(f"{version}: docker pull {images.get(version)}")
+    lines.append("")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Print the supported versions of kubernetes-csi repositories.",
+        epilog="Example: %(prog)s"
+               " -R kubernetes-csi/external-attacher"
+               " -R kubernetes-csi/external-provisioner"
+               " -R kubernetes-csi/external-resizer"
+               " -R kubernetes-csi/external-snapshotter"
+               " -R kubernetes-csi/livenessprobe"
+               " -R kubernetes-csi/node-driver-registrar"
+               " -R kubernetes-csi/csi-driver-nfs")
+    parser.add_argument("--repo", "-R", required=True, nargs="+", action="extend",
+                        dest="repos",
+                        help="kubernetes-csi repositories to check; accepts several "
+                             "names after one flag and the flag may be repeated")
+    parser.add_argument("--doc", "-d", action="store_true",
+                        help="also print the docker image of each supported release")
+    args = parser.parse_args()
+    if not _github_token():
+        check_gh_command()
+    now = datetime.datetime.now()
+    # The repositories are independent, so process them concurrently and
+    # print the blocks in the order they were given on the command line.
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(args.repos)) as executor:
+        blocks = executor.map(lambda repo: process_repo(repo, args.doc, now), args.repos)
+        # One write for the whole report instead of one per line.
+        sys.stdout.write("\n".join(blocks) + "\n")
+
+
+if __name__ == "__main__":
+    main()